@@ -1,24 +1,32 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from typing import Optional, List, Dict, Tuple
+import jwt
+from typing import Optional, List, Tuple
 from pydantic import BaseModel, EmailStr, Field
 import os
 from dotenv import load_dotenv
 from transformers import pipeline
+import torch
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import httpx
 import re
 from bson import ObjectId
-import json
 import uvicorn
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+import orjson
 from fastapi.encoders import jsonable_encoder
 import time
+import itertools
+import secrets
+from blake3 import blake3
+from cachetools import LRUCache, TTLCache
+from throttled.asyncio import Throttled, RateLimiterType, rate_limiter
 
 load_dotenv()
 
@@ -28,11 +36,27 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+MAX_PLAYLIST_PAGES = 20
+YOUTUBE_PLAYLIST_RE = re.compile(r'[?&]list=([^&#]+)')
+INSTAGRAM_URL_RE = re.compile(r'https?://(?:www\.)?instagram\.com/(?:reel|p)/([a-zA-Z0-9_-]+)/?')
+CLASSIFIER_MODEL = os.getenv("CLASSIFIER_MODEL", "valhalla/distilbart-mnli-12-3")
+CLASSIFIER_CACHE_DIR = os.getenv(
+    "CLASSIFIER_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "prodvision", "models")
+)
+CLASSIFIER_RETRY_SECONDS = 300
 
 
 RATE_LIMIT_DURATION = 60  
 MAX_ATTEMPTS = 5  
-login_attempts: Dict[str, Tuple[int, float]] = {}  
+login_throttle = Throttled(
+    using=RateLimiterType.TOKEN_BUCKET.value,
+    quota=rate_limiter.per_duration(
+        timedelta(seconds=RATE_LIMIT_DURATION),
+        limit=MAX_ATTEMPTS,
+        burst=MAX_ATTEMPTS
+    )
+)
 
 app = FastAPI()
 
@@ -56,10 +80,11 @@ async def generic_exception_handler(request, exc):
 # Database connection with retry logic
 async def connect_to_mongo():
     try:
-        client = AsyncIOMotorClient(
+        client = AsyncMongoClient(
             MONGODB_URL,
             serverSelectionTimeoutMS=5000,
-            maxPoolSize=10
+            maxPoolSize=50,
+            minPoolSize=5
         )
         await client.admin.command('ping')
         return client
@@ -67,6 +92,21 @@ async def connect_to_mongo():
         print(f"Failed to connect to MongoDB: {e}")
         return None
 
+async def ensure_indexes(db):
+    # Created one by one so a unique index failing on existing duplicates
+    # doesn't prevent the others from being built
+    indexes = [
+        (db.videos, [("userId", 1), ("savedAt", -1)], {}),
+        (db.videos, [("watchStatus", 1), ("savedAt", 1)], {}),
+        (db.users, [("email", 1)], {"unique": True}),
+        (db.videos, [("userId", 1), ("id", 1)], {"unique": True}),
+    ]
+    for collection, keys, options in indexes:
+        try:
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            print(f"Failed to create index {keys} on {collection.name}: {e}")
+
 # Initialize database connection
 db = None
 
@@ -76,7 +116,13 @@ async def startup_db_client():
     client = await connect_to_mongo()
     if client:
         db = client.videodb
+        await ensure_indexes(db)
         print("Connected to MongoDB")
+        app.state.http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+            timeout=10.0
+        )
     else:
         raise Exception("Failed to connect to MongoDB")
 
@@ -84,9 +130,11 @@ async def startup_db_client():
 async def shutdown_db_client():
     global db
     if db is not None:
-        db.client.close()
+        await db.client.close()
         print("Closed MongoDB connection")
         db = None
+    if getattr(app.state, "http", None) is not None:
+        await app.state.http.aclose()
 
 # Security
 pwd_context = CryptContext(
@@ -97,6 +145,11 @@ pwd_context = CryptContext(
 )
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Short-lived caches for the auth hot path; the TTL bounds revocation lag
+_token_cache = TTLCache(maxsize=10000, ttl=10)
+_user_cache = TTLCache(maxsize=5000, ttl=30)
+_password_cache = TTLCache(maxsize=5000, ttl=30)
+
 # Models
 class Token(BaseModel):
     access_token: str
@@ -139,32 +192,25 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 async def get_user(email: str):
-    if (user := await db.users.find_one({"email": email})):
-        return User(**user)
+    if (user := _user_cache.get(email)):
+        return user
+    if (user := await db.users.find_one(
+        {"email": email},
+        {"_id": 0, "email": 1, "name": 1, "hashed_password": 1}
+    )):
+        user = User(**user)
+        _user_cache[email] = user
+        return user
 
 # Add this function for rate limiting
 async def check_rate_limit(request: Request):
-    client_ip = request.client.host
-    current_time = time.time()
-    
-    if client_ip in login_attempts:
-        attempts, first_attempt = login_attempts[client_ip]
-        # Reset attempts if duration has passed
-        if current_time - first_attempt > RATE_LIMIT_DURATION:
-            login_attempts[client_ip] = (1, current_time)
-        else:
-            # Check if too many attempts
-            if attempts >= MAX_ATTEMPTS:
-                time_left = int(RATE_LIMIT_DURATION - (current_time - first_attempt))
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail=f"Too many login attempts. Please try again in {time_left} seconds"
-                )
-            # Increment attempts
-            login_attempts[client_ip] = (attempts + 1, first_attempt)
-    else:
-        # First attempt
-        login_attempts[client_ip] = (1, current_time)
+    result = await login_throttle.limit(request.client.host)
+    if result.limited:
+        time_left = max(1, int(result.state.retry_after))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many login attempts. Please try again in {time_left} seconds"
+        )
 
 # Update the login endpoint
 @app.post("/api/auth/login")
@@ -186,33 +232,29 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
             )
         
    
-        if not verify_password(form_data.password, user.hashed_password):
-       
-            client_ip = request.client.host
-            current_attempts, first_attempt = login_attempts.get(client_ip, (0, time.time()))
-            login_attempts[client_ip] = (current_attempts + 1, first_attempt)
-            
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect password",
-                headers={"WWW-Authenticate": "Bearer"},
+        # Only successful verifications are cached, so repeat logins skip bcrypt
+        password_key = blake3(f"{email}:{form_data.password}".encode()).digest(length=16)
+        if _password_cache.get(password_key) != user.hashed_password:
+            verified = await asyncio.get_event_loop().run_in_executor(
+                None, verify_password, form_data.password, user.hashed_password
             )
+            if not verified:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Incorrect password",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            _password_cache[password_key] = user.hashed_password
         
        
         access_token = create_access_token(
             data={
                 "sub": user.email,
                 "name": user.name,
-                "iat": datetime.utcnow(),
-                "type": "access",
                 "client_ip": request.client.host
             }
         )
         
-       
-        if request.client.host in login_attempts:
-            del login_attempts[request.client.host]
-        
         
         return {
             "access_token": access_token,
@@ -233,14 +275,17 @@ async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends
         )
 
 
+# Randomly seeded so token ids don't repeat across restarts or workers
+_jti_counter = itertools.count(secrets.randbits(32))
+
 def create_access_token(data: dict):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    now = datetime.utcnow()
     to_encode.update({
-        "exp": expire,
-        "iat": datetime.utcnow(),
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+        "iat": now,
         "type": "access",
-        "jti": f"{int(time.time())}_{os.urandom(8).hex()}"  
+        "jti": f"{time.time_ns():x}_{next(_jti_counter):x}"
     })
     try:
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -253,23 +298,29 @@ def create_access_token(data: dict):
         )
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    token_key = blake3(token.encode()).digest(length=16)
+    cached = _token_cache.get(token_key)
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        token_data = TokenData(email=email)
+        if cached and cached[1] > time.time():
+            token_data = TokenData(email=cached[0])
+        else:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid authentication credentials",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            token_data = TokenData(email=email)
+            _token_cache[token_key] = (email, payload["exp"])
     except jwt.ExpiredSignatureError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token has expired",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -297,12 +348,12 @@ async def register(user: UserCreate):
             )
         
         
-        if not any(char.isdigit() for char in user.password):
+        if not any(map(str.isdigit, user.password)):
             raise HTTPException(
                 status_code=400,
                 detail="Password must contain at least one number"
             )
-        if not any(char.isupper() for char in user.password):
+        if not any(map(str.isupper, user.password)):
             raise HTTPException(
                 status_code=400,
                 detail="Password must contain at least one uppercase letter"
@@ -319,6 +370,13 @@ async def register(user: UserCreate):
         
         try:
             await db.users.insert_one(user_dict)
+            _user_cache.pop(user_dict["email"], None)
+        except DuplicateKeyError:
+            # Lost a race with a concurrent registration for the same email
+            raise HTTPException(
+                status_code=400,
+                detail="Email already registered"
+            )
         except Exception as e:
             print(f"Database error during registration: {e}")
             raise HTTPException(
@@ -340,156 +398,255 @@ async def register(user: UserCreate):
             detail="An unexpected error occurred during registration"
         )
 
-class JSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        return super().default(obj)
+def orjson_default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError
 
-@app.get("/api/videos")
+class UTCJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        # Stored datetimes are naive UTC; serialize them with an explicit offset
+        return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NAIVE_UTC)
+
+@app.get("/api/videos", response_class=UTCJSONResponse)
 async def get_videos(current_user: User = Depends(get_current_user)):
     try:
-        cursor = db.videos.find({"userId": current_user.email})
-        videos = []
-        async for video in cursor:
-           
-            video["_id"] = str(video["_id"])
-            if isinstance(video.get("savedAt"), datetime):
-                video["savedAt"] = video["savedAt"].isoformat()
-            videos.append(video)
-        return videos
+        cursor = db.videos.find(
+            {"userId": current_user.email},
+            {"description": 0}
+        ).batch_size(200)
+        videos = [video async for video in cursor]
+        return UTCJSONResponse(videos)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch videos: {str(e)}")
 
 
-classifier = pipeline("zero-shot-classification")
+# Zero-shot classifier is loaded on first use so auth-only workers never pay for it
+_classifier = None
+_classifier_failed_at = None
+_classifier_lock = asyncio.Lock()
 
+def quantized_classifier_dir():
+    return os.path.join(CLASSIFIER_CACHE_DIR, CLASSIFIER_MODEL.replace("/", "--") + "-int8")
 
-async def classify_video_genre(title: str, description: str = "") -> str:
+def load_classifier():
+    if torch.cuda.is_available():
+        # On a GPU host run the FP16 PyTorch model on the first device instead
+        return pipeline(
+            "zero-shot-classification",
+            model=CLASSIFIER_MODEL,
+            device=0,
+            torch_dtype=torch.float16
+        )
+    
+    # The int8 model is built ahead of time by export_classifier.py; without it, use the FP32 pipeline
+    quantized_dir = quantized_classifier_dir()
+    if not os.path.isdir(quantized_dir):
+        return pipeline("zero-shot-classification", model=CLASSIFIER_MODEL, device=-1)
+    
     try:
-       
-        candidate_labels = [
-            "Music and Entertainment",
-            "Gaming and Esports",
-            "Education and Learning",
-            "Technology and Programming",
-            "Lifestyle and Vlogs",
-            "Sports and Fitness",
-            "News and Politics",
-            "Arts and Creativity",
-            "Science and Nature",
-            "Food and Cooking"
-        ]
-        
-       
-        text_to_classify = f"{title}. {description}"
-        
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+    except ImportError:
+        # Optimum not installed, fall back to the plain FP32 PyTorch pipeline
+        return pipeline("zero-shot-classification", model=CLASSIFIER_MODEL, device=-1)
+    
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = os.cpu_count() or 1
+    model = ORTModelForSequenceClassification.from_pretrained(
+        quantized_dir,
+        file_name="model_quantized.onnx",
+        session_options=session_options
+    )
+    tokenizer = AutoTokenizer.from_pretrained(CLASSIFIER_MODEL)
+    return pipeline("zero-shot-classification", model=model, tokenizer=tokenizer)
+
+async def get_classifier():
+    global _classifier, _classifier_failed_at
+    if _classifier is None:
+        async with _classifier_lock:
+            if _classifier is None:
+                # After a failed load, wait out the cooldown instead of retrying on every request
+                if _classifier_failed_at is not None and time.time() - _classifier_failed_at < CLASSIFIER_RETRY_SECONDS:
+                    raise RuntimeError("Genre classifier unavailable") from None
+                try:
+                    _classifier = await asyncio.get_event_loop().run_in_executor(None, load_classifier)
+                    _classifier_failed_at = None
+                except Exception as e:
+                    print(f"Failed to load genre classifier: {e}")
+                    _classifier_failed_at = time.time()
+                    raise RuntimeError("Genre classifier unavailable") from None
+    return _classifier
+
+GENRE_LABELS = {
+    "Music and Entertainment": "music",
+    "Gaming and Esports": "gaming",
+    "Education and Learning": "education",
+    "Technology and Programming": "technology",
+    "Lifestyle and Vlogs": "lifestyle",
+    "Sports and Fitness": "sports",
+    "News and Politics": "news",
+    "Arts and Creativity": "arts",
+    "Science and Nature": "science",
+    "Food and Cooking": "food"
+}
+CLASSIFY_BATCH_SIZE = 32 if torch.cuda.is_available() else 16
+# The pipeline isn't safe to call from several threads at once, so inference runs one call at a time
+_classifier_executor = ThreadPoolExecutor(max_workers=1)
+_genre_cache = LRUCache(maxsize=100_000)
+
+
+async def classify_video_genres(items: List[Tuple[str, str]]) -> List[str]:
+    if not items:
+        return []
+    
+    keys = [blake3(f"{title}|{description[:500]}".encode()).digest(length=16) for title, description in items]
+    genres = [_genre_cache.get(key) for key in keys]
+    misses = [i for i, genre in enumerate(genres) if genre is None]
+    if not misses:
+        return genres
+    
+    try:
+        candidate_labels = list(GENRE_LABELS)
+        texts = [f"{items[i][0]}. {items[i][1]}" for i in misses]
+        classifier = await get_classifier()
         
-        result = classifier(
-            text_to_classify,
-            candidate_labels,
-            multi_label=False
+        # One batched forward pass for the whole list, off the event loop
+        results = await asyncio.get_event_loop().run_in_executor(
+            _classifier_executor,
+            lambda: classifier(
+                texts,
+                candidate_labels,
+                multi_label=False,
+                batch_size=CLASSIFY_BATCH_SIZE
+            )
         )
+        if isinstance(results, dict):
+            results = [results]
         
-       
-        genre_mapping = {
-            "Music and Entertainment": "music",
-            "Gaming and Esports": "gaming",
-            "Education and Learning": "education",
-            "Technology and Programming": "technology",
-            "Lifestyle and Vlogs": "lifestyle",
-            "Sports and Fitness": "sports",
-            "News and Politics": "news",
-            "Arts and Creativity": "arts",
-            "Science and Nature": "science",
-            "Food and Cooking": "food"
-        }
-        
-        
-        top_label = result["labels"][0]
-        return genre_mapping.get(top_label, "other")
+        for i, result in zip(misses, results):
+            genres[i] = GENRE_LABELS.get(result["labels"][0], "other")
+            _genre_cache[keys[i]] = genres[i]
+        return genres
     except Exception as e:
         print(f"Genre classification error: {str(e)}")
-        return "other"
+        return [genre or "other" for genre in genres]
 
-@app.post("/api/videos/youtube")
+async def classify_video_genre(title: str, description: str = "") -> str:
+    return (await classify_video_genres([(title, description)]))[0]
+
+async def fetch_playlist_page(client: httpx.AsyncClient, playlist_id: str, page_token: Optional[str] = None):
+    params = {
+        "part": "snippet",
+        "playlistId": playlist_id,
+        "maxResults": 50,
+        "key": YOUTUBE_API_KEY
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    
+    response = await client.get(
+        "https://www.googleapis.com/youtube/v3/playlistItems",
+        params=params
+    )
+    
+    if response.status_code == 403:
+        raise HTTPException(status_code=403, detail="YouTube API key is invalid or quota exceeded")
+    elif response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to fetch playlist. Please check the URL and try again.")
+    
+    data = response.json()
+    return data.get("items", []), data.get("nextPageToken")
+
+@app.post("/api/videos/youtube", response_class=UTCJSONResponse)
 async def add_youtube_playlist(request: PlaylistRequest, current_user: User = Depends(get_current_user)):
     try:
        
-        if "list=" not in request.playlist_url:
+        match = YOUTUBE_PLAYLIST_RE.search(request.playlist_url)
+        if not match:
             raise HTTPException(status_code=400, detail="Invalid YouTube playlist URL")
         
-        playlist_id = request.playlist_url.split("list=")[-1].split("&")[0]
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://www.googleapis.com/youtube/v3/playlistItems",
-                params={
-                    "part": "snippet",
-                    "playlistId": playlist_id,
-                    "maxResults": 50,
-                    "key": YOUTUBE_API_KEY
-                }
+        playlist_id = match.group(1)
+        
+        client = app.state.http
+        # Page tokens are opaque and chained, so pages have to be walked in order
+        items, page_token = await fetch_playlist_page(client, playlist_id)
+        pages = 1
+        while page_token and pages < MAX_PLAYLIST_PAGES:
+            page_items, page_token = await fetch_playlist_page(client, playlist_id, page_token)
+            items.extend(page_items)
+            pages += 1
+        # A leftover page token means the playlist is longer than we import
+        truncated = page_token is not None
+        
+        if not items:
+            raise HTTPException(status_code=404, detail="No videos found in playlist")
+        
+        entries = []
+        for item in items:
+            snippet = item["snippet"]
+            thumbnails = snippet["thumbnails"]
+            thumbnail_url = (
+                thumbnails.get("maxres", {}).get("url") or
+                thumbnails.get("high", {}).get("url") or
+                thumbnails.get("medium", {}).get("url") or
+                thumbnails.get("default", {}).get("url")
             )
+            entries.append((
+                snippet["resourceId"]["videoId"],
+                snippet["title"],
+                snippet.get("description", ""),
+                thumbnail_url
+            ))
+        
+        genres = await classify_video_genres(
+            [(title, description) for _, title, description, _ in entries]
+        )
+        
+        videos = []
+        current_time = datetime.utcnow()
+        
+        for (video_id, title, description, thumbnail_url), video_genre in zip(entries, genres):
+            video = {
+                "id": video_id,
+                "title": title,
+                "thumbnail": thumbnail_url,
+                "platform": "youtube",
+                "genre": video_genre,
+                "savedAt": current_time,
+                "watchStatus": "unwatched",
+                "userId": current_user.email,
+                "description": description
+            }
+            videos.append(video)
+        
+        if videos:
+            # Unordered so one duplicate (already saved video) doesn't abort the rest
+            try:
+                await db.videos.insert_many(videos, ordered=False)
+                inserted_ids = [video["id"] for video in videos]
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                if any(error["code"] != 11000 for error in write_errors):
+                    raise
+                rejected = {error["index"] for error in write_errors}
+                inserted_ids = [video["id"] for i, video in enumerate(videos) if i not in rejected]
+            inserted = len(inserted_ids)
             
-            if response.status_code == 403:
-                raise HTTPException(status_code=403, detail="YouTube API key is invalid or quota exceeded")
-            elif response.status_code != 200:
-                raise HTTPException(status_code=400, detail="Failed to fetch playlist. Please check the URL and try again.")
-            
-            data = response.json()
-            if not data.get("items"):
-                raise HTTPException(status_code=404, detail="No videos found in playlist")
-            
-            videos = []
-            current_time = datetime.utcnow()
+            message = f"Successfully added {inserted} videos from playlist"
+            if truncated:
+                message += f" (playlist is longer than the import limit; only its first {len(videos)} videos were checked)"
             
-            for item in data["items"]:
-                snippet = item["snippet"]
-                video_id = snippet["resourceId"]["videoId"]
-                title = snippet["title"]
-                description = snippet.get("description", "")
-                
-               
-                video_genre = await classify_video_genre(title, description)
-                
-                
-                thumbnails = snippet["thumbnails"]
-                thumbnail_url = (
-                    thumbnails.get("maxres", {}).get("url") or
-                    thumbnails.get("high", {}).get("url") or
-                    thumbnails.get("medium", {}).get("url") or
-                    thumbnails.get("default", {}).get("url")
-                )
-                
-                video = {
-                    "id": video_id,
-                    "title": title,
-                    "thumbnail": thumbnail_url,
-                    "platform": "youtube",
-                    "genre": video_genre,
-                    "savedAt": current_time,
-                    "watchStatus": "unwatched",
-                    "userId": current_user.email,
-                    "description": description
-                }
-                videos.append(video)
+            return {
+                "message": message,
+                "count": inserted,
+                "truncated": truncated,
+                "ids": inserted_ids
+            }
+        else:
+            raise HTTPException(status_code=404, detail="No valid videos found in playlist")
             
-            if videos:
-                
-                result = await db.videos.insert_many(videos)
-                
-                
-                return JSONEncoder().encode({
-                    "message": f"Successfully added {len(videos)} videos from playlist",
-                    "count": len(videos),
-                    "videos": videos
-                })
-            else:
-                raise HTTPException(status_code=404, detail="No valid videos found in playlist")
-                
     except HTTPException:
         raise
     except Exception as e:
@@ -499,11 +656,11 @@ async def add_youtube_playlist(request: PlaylistRequest, current_user: User = De
 async def add_instagram_video(request: InstagramRequest, current_user: User = Depends(get_current_user)):
     try:
         
-        if not re.match(r'https?://(?:www\.)?instagram\.com/(?:reel|p)/[a-zA-Z0-9_-]+/?.*', request.url):
+        match = INSTAGRAM_URL_RE.match(request.url)
+        if not match:
             raise HTTPException(status_code=400, detail="Invalid Instagram URL")
             
-       
-        video_id = re.search(r'/(?:reel|p)/([a-zA-Z0-9_-]+)/?', request.url).group(1)
+        video_id = match.group(1)
         
        
         INSTAGRAM_ACCESS_TOKEN = os.getenv("INSTAGRAM_ACCESS_TOKEN")
@@ -513,61 +670,63 @@ async def add_instagram_video(request: InstagramRequest, current_user: User = De
                 detail="Instagram integration requires API setup. Please configure INSTAGRAM_ACCESS_TOKEN in .env"
             )
             
-        async with httpx.AsyncClient() as client:
-            
-            response = await client.get(
-                f"https://graph.instagram.com/v12.0/{video_id}",
-                params={
-                    "fields": "id,media_type,media_url,thumbnail_url,permalink,caption",
-                    "access_token": INSTAGRAM_ACCESS_TOKEN
-                }
+        client = app.state.http
+        
+        response = await client.get(
+            f"https://graph.instagram.com/v12.0/{video_id}",
+            params={
+                "fields": "id,media_type,media_url,thumbnail_url,permalink,caption",
+                "access_token": INSTAGRAM_ACCESS_TOKEN
+            }
+        )
+        
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=400,
+                detail="Failed to fetch Instagram video. Please check the URL and try again."
             )
             
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Failed to fetch Instagram video. Please check the URL and try again."
-                )
-                
-            data = response.json()
-            
-           
-            if data.get("media_type") not in ["VIDEO", "REELS"]:
-                raise HTTPException(
-                    status_code=400,
-                    detail="URL must point to a video or reel"
-                )
-                
+        data = response.json()
+        
            
-            caption = data.get("caption", "")
-            video_genre = await classify_video_genre(caption)
-            
-            video = {
-                "id": data["id"],
-                "title": caption[:100] + "..." if len(caption) > 100 else caption,
-                "thumbnail": data.get("thumbnail_url", ""),
-                "platform": "instagram",
-                "genre": video_genre,
-                "savedAt": datetime.utcnow().isoformat(),
-                "watchStatus": "unwatched",
-                "userId": current_user.email,
-                "description": caption,
-                "originalUrl": data["permalink"]
-            }
+        if data.get("media_type") not in ["VIDEO", "REELS"]:
+            raise HTTPException(
+                status_code=400,
+                detail="URL must point to a video or reel"
+            )
             
+           
+        caption = data.get("caption", "")
+        video_genre = await classify_video_genre(caption)
+        
+        video = {
+            "id": data["id"],
+            "title": caption[:100] + "..." if len(caption) > 100 else caption,
+            "thumbnail": data.get("thumbnail_url", ""),
+            "platform": "instagram",
+            "genre": video_genre,
+            "savedAt": datetime.utcnow().isoformat(),
+            "watchStatus": "unwatched",
+            "userId": current_user.email,
+            "description": caption,
+            "originalUrl": data["permalink"]
+        }
         
+        try:
             await db.videos.insert_one(video)
-            
-            return {
-                "message": "Successfully added Instagram video",
-                "video": {
-                    "id": video["id"],
-                    "title": video["title"],
-                    "platform": "instagram",
-                    "genre": video["genre"]
-                }
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail="Instagram video already saved")
+        
+        return {
+            "message": "Successfully added Instagram video",
+            "video": {
+                "id": video["id"],
+                "title": video["title"],
+                "platform": "instagram",
+                "genre": video["genre"]
             }
-            
+        }
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -591,20 +750,24 @@ async def update_watch_status(video_id: str, status: str, current_user: User = D
     
     return {"message": "Watch status updated"}
 
-async def send_notification(user_email: str, video_title: str):
+async def send_notification(user_email: str, video_titles: List[str]):
     # TODO: Implement notification system (email, push notifications, etc.)
-    print(f"Sending notification to {user_email} about {video_title}")
+    print(f"Sending notification to {user_email} about {len(video_titles)} unwatched videos: {', '.join(video_titles)}")
 
 async def check_unwatched_videos():
     while True:
         two_weeks_ago = datetime.utcnow() - timedelta(days=14)
-        unwatched_videos = await db.videos.find({
-            "watchStatus": "unwatched",
-            "savedAt": {"$lte": two_weeks_ago}
-        }).to_list(length=None)
+        # Served by the (watchStatus, savedAt) index, grouped so each user gets one notification
+        cursor = await db.videos.aggregate([
+            {"$match": {
+                "watchStatus": "unwatched",
+                "savedAt": {"$lte": two_weeks_ago}
+            }},
+            {"$group": {"_id": "$userId", "titles": {"$push": "$title"}}}
+        ], batchSize=500)
         
-        for video in unwatched_videos:
-            await send_notification(video["userId"], video["title"])
+        async for doc in cursor:
+            await send_notification(doc["_id"], doc["titles"])
         
         await asyncio.sleep(86400)  
 
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+import tempfile
+
+from app import CLASSIFIER_CACHE_DIR, CLASSIFIER_MODEL, quantized_classifier_dir
+
+
+def export_quantized_classifier() -> str:
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    quantized_dir = quantized_classifier_dir()
+    if os.path.isdir(quantized_dir):
+        return quantized_dir
+
+    # Export into a private temp dir and rename it into place, so a running
+    # server never sees a half-written model
+    os.makedirs(CLASSIFIER_CACHE_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".export-", dir=CLASSIFIER_CACHE_DIR)
+    try:
+        onnx_model = ORTModelForSequenceClassification.from_pretrained(CLASSIFIER_MODEL, export=True)
+        quantizer = ORTQuantizer.from_pretrained(onnx_model)
+        quantizer.quantize(
+            save_dir=tmp_dir,
+            quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        )
+        onnx_model.config.save_pretrained(tmp_dir)
+        try:
+            os.rename(tmp_dir, quantized_dir)
+        except OSError:
+            # Another export finished first
+            if not os.path.isdir(quantized_dir):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return quantized_dir
+
+
+if __name__ == "__main__":
+    try:
+        path = export_quantized_classifier()
+    except ImportError:
+        print("optimum[onnxruntime] is required to export the quantized classifier")
+        sys.exit(1)
+    print(f"Quantized {CLASSIFIER_MODEL} classifier available at {path}")